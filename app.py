@@ -1,14 +1,23 @@
 import os
 import uuid
 import time
+import bisect
+import re
 import json
 import shutil
-import hashlib
+import threading
 import random
+from collections import Counter, deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from datetime import datetime, timezone
 from pathlib import Path
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+import orjson
+import xxhash
+from flask import Flask, render_template, request, send_from_directory
+from sortedcontainers import SortedList
 
 from image_to_binary import image_to_binary
 
@@ -17,6 +26,12 @@ UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
 KEYS_BASE_DIR = os.path.join(BASE_DIR, "static", "keys")
 RAW_IMG_DIR = os.path.join(BASE_DIR, "RawImg")
 TEMP_DECRYPT_DIR = os.path.join(BASE_DIR, "tmp_decrypt")
+BINARY_CACHE_FILE = os.path.join(KEYS_BASE_DIR, "_binary_cache.json")
+# 图片编码流程变更（如灰度解码路径）时递增，旧的二进制编码缓存自动作废重建
+CACHE_VERSION = 2
+# 密钥映射额外依赖字符下标哈希算法，算法变更时单独递增，
+# 这样只重建 mapping.json 而不用重跑 SIFT
+MAPPING_VERSION = 3
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(KEYS_BASE_DIR, exist_ok=True)
@@ -30,18 +45,48 @@ app = Flask(__name__)
 app.config["SECRET_KEY"] = "dev-secret-key"
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-# 聊天历史（内存）
-messages = []
+# 聊天历史（内存），deque(maxlen) 写满后自动从头部淘汰，O(1) 且无整表复制；
+# _message_ts 与 messages 平行，存每条消息的 tsMs，
+# 供 /api/messages 二分查找 since 的位置（tsMs 单调递增）
 MAX_HISTORY = 200
+messages = deque(maxlen=MAX_HISTORY)
+_message_ts = []
 
 # 在线用户：user_id -> {"username": ..., "last_seen": timestamp}
 online_users = {}
+# 按 (last_seen, user_id) 排序的索引，get_online_users 用 irange 只取活跃区间，
+# 不必每次心跳都全量扫描 online_users
+_online_index = SortedList()
+# 心跳间隔约 7-8 秒，超过这个阈值没心跳就认为离线
+_ONLINE_TIMEOUT_MS = 25_000
+# 在线列表缓存：成员变动（新用户、离线回归、登出）时递增 version 立即失效，
+# 纯时间导致的离线靠短 TTL 兜底，其余心跳直接复用缓存结果
+_online_version = 0
+_online_cache = {"version": -1, "payload": None, "computed_at": 0}
+_ONLINE_CACHE_TTL_MS = 2_000
 
 
 def now_ms():
     return int(time.time() * 1000)
 
 
+def json_response(payload, status=200):
+    """
+    用 orjson 序列化构造 JSON 响应
+    /api/messages 每次轮询都要序列化最多200条消息，orjson 比 jsonify 快数倍
+    """
+    return app.response_class(orjson.dumps(payload), status=status, mimetype="application/json")
+
+
+def save_upload(file, save_path):
+    """
+    把上传文件流式写到磁盘。64KB 缓冲比 FileStorage.save
+    默认的 8KB 少 8 倍 write 系统调用，对几 MB 的图片明显更快
+    """
+    with open(save_path, "wb") as out:
+        shutil.copyfileobj(file.stream, out, length=64 * 1024)
+
+
 def make_message(user_id, username, msg_type, content):
     """
     构造消息对象
@@ -58,48 +103,190 @@ def make_message(user_id, username, msg_type, content):
     }
 
 
-def prune_history():
-    global messages
-    if len(messages) > MAX_HISTORY:
-        messages = messages[-MAX_HISTORY:]
+def append_message(msg):
+    if len(messages) == MAX_HISTORY:
+        # deque 即将淘汰最老的一条，时间戳表同步删除
+        del _message_ts[0]
+    messages.append(msg)
+    _message_ts.append(msg["tsMs"])
+
+
+def _touch_online(user_id, username):
+    """
+    更新用户心跳时间，并同步维护 (last_seen, user_id) 排序索引；
+    成员变动（新上线或离线回归）时递增在线列表版本号
+    """
+    global _online_version
+    now = now_ms()
+    info = online_users.get(user_id)
+    if info is None:
+        info = {}
+        online_users[user_id] = info
+    old_seen = info.get("last_seen")
+    if old_seen is None or old_seen < now - _ONLINE_TIMEOUT_MS:
+        _online_version += 1
+    if old_seen is not None:
+        _online_index.discard((old_seen, user_id))
+    info["username"] = username
+    info["last_seen"] = now
+    _online_index.add((now, user_id))
+
+
+def _remove_online(user_id):
+    global _online_version
+    info = online_users.pop(user_id, None)
+    if info is not None and info.get("last_seen") is not None:
+        _online_index.discard((info["last_seen"], user_id))
+        _online_version += 1
 
 
 def get_online_users():
-    # 心跳间隔约 7-8 秒，这里给一个稍微宽松的阈值
-    cutoff = now_ms() - 25_000  # 25 秒没心跳就认为离线
-    return [
-        {"userId": uid, "username": info["username"]}
-        for uid, info in online_users.items()
-        if info.get("last_seen", 0) >= cutoff
+    now = now_ms()
+    if (
+        _online_cache["payload"] is not None
+        and _online_cache["version"] == _online_version
+        and now - _online_cache["computed_at"] < _ONLINE_CACHE_TTL_MS
+    ):
+        return _online_cache["payload"]
+
+    cutoff = now - _ONLINE_TIMEOUT_MS
+    payload = [
+        {"userId": uid, "username": online_users[uid]["username"]}
+        for _, uid in _online_index.irange((cutoff,))
     ]
+    _online_cache["version"] = _online_version
+    _online_cache["payload"] = payload
+    _online_cache["computed_at"] = now
+    return payload
 
 
 def generate_random_key(length: int = 8) -> str:
-    return "".join(random.choice(KEY_CHARSET) for _ in range(length))
+    # random.choices 一次C级调用生成全部字符，避免逐字符的Python开销
+    return "".join(random.choices(KEY_CHARSET, k=length))
+
+
+# 预计算字符 -> 下标的查表（256项），其他字符统一映射为空格
+_SPACE_INDEX = ALPHABET.index(" ")
+_CHAR_TO_INDEX = bytearray([_SPACE_INDEX]) * 256
+for _i, _c in enumerate(ALPHABET):
+    _CHAR_TO_INDEX[ord(_c)] = _i
+    _CHAR_TO_INDEX[ord(_c.lower())] = _i
 
 
 def char_to_index(ch: str) -> int:
-    ch = ch.upper()
-    if ch in ALPHABET:
-        return ALPHABET.index(ch)
-    # 其他字符统一映射为空格
-    return ALPHABET.index(" ")
+    code = ord(ch)
+    if code < 256:
+        return _CHAR_TO_INDEX[code]
+    # 极少数非 Latin-1 字符（如 ı -> I）仍走原来的慢路径
+    upper = ch.upper()
+    if upper in ALPHABET:
+        return ALPHABET.index(upper)
+    return _SPACE_INDEX
 
 
 def index_to_char(idx: int) -> str:
     return ALPHABET[idx % ALPHABET_SIZE]
 
 
+# 目录名中允许的字符之外全部替换为下划线
+_UNSAFE_KEY_CHARS = re.compile(r"[^A-Za-z0-9\-_.]")
+
+
+@lru_cache(maxsize=1024)
 def safe_key_name(key: str) -> str:
-    # 简单处理目录名安全问题
-    return "".join(c if c.isalnum() or c in "-_." else "_" for c in key) or "default"
+    # 简单处理目录名安全问题；同一批密钥反复出现，结果直接缓存
+    return _UNSAFE_KEY_CHARS.sub("_", key) or "default"
+
+
+def _char_index_from_bytes(data: bytes) -> int:
+    # 这里的哈希只负责把 (key, 二进制编码) 均匀散列到 0..28，
+    # 没有安全性要求，XXH3 比 SHA-256 快一个数量级
+    return xxhash.xxh3_64_intdigest(data) % ALPHABET_SIZE
 
 
 def compute_char_index(binary_code: str, key: str) -> int:
-    data = (key + ":" + (binary_code or "")).encode("utf-8")
-    digest = hashlib.sha256(data).digest()
-    value = int.from_bytes(digest[:4], "big")
-    return value % ALPHABET_SIZE
+    return _char_index_from_bytes((key + ":" + (binary_code or "")).encode("utf-8"))
+
+
+def _binary_for_image(path_str):
+    """
+    子进程工作函数：计算单张图片的32位二进制编码
+    """
+    binary_string, _, _ = image_to_binary(path_str)
+    return os.path.basename(path_str), binary_string
+
+
+def load_image_binaries(image_files):
+    """
+    获取 {图片文件名: 32位二进制编码} 映射，带磁盘缓存。
+    二进制编码只取决于图片内容，与密钥无关，
+    所以 SIFT 只需对每张图片算一次，之后所有密钥直接复用。
+    缓存缺失的图片用进程池并行计算（SIFT 是 CPU 密集型）。
+    """
+    cache = {}
+    if os.path.exists(BINARY_CACHE_FILE):
+        try:
+            with open(BINARY_CACHE_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("version") == CACHE_VERSION:
+                cache = data["binaries"]
+        except (OSError, json.JSONDecodeError, KeyError):
+            cache = {}
+
+    missing = [str(p) for p in image_files if p.name not in cache]
+
+    updated = False
+    if missing:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for name, binary_string in executor.map(_binary_for_image, missing, chunksize=8):
+                if binary_string:
+                    cache[name] = binary_string
+                    updated = True
+
+    if updated:
+        with open(BINARY_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "binaries": cache}, f, ensure_ascii=False)
+
+    return cache
+
+
+# 防止并发请求对同一密钥重复初始化：正在初始化的 key_name 集合 + 条件变量
+_init_cond = threading.Condition()
+_initializing_keys = set()
+
+
+def _scan_existing_keys():
+    """
+    启动时扫描一次历史密钥目录。os.scandir 直接用目录项的类型信息，
+    不像 Path.iterdir + is_dir 那样每项多一次 stat 系统调用
+    """
+    keys = set()
+    try:
+        with os.scandir(KEYS_BASE_DIR) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    keys.add(entry.name)
+    except OSError:
+        pass
+    return keys
+
+
+# 历史密钥目录名缓存，新建密钥时由 _build_key_mapping 增量更新
+_existing_keys = _scan_existing_keys()
+
+
+def _load_mapping_file(mapping_file):
+    if not os.path.exists(mapping_file):
+        return None
+    try:
+        with open(mapping_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and data.get("version") == MAPPING_VERSION:
+            return data["groups"]
+    except (OSError, json.JSONDecodeError, KeyError):
+        pass
+    # 版本不符（编码流程已变更）则重建映射
+    return None
 
 
 def initialize_key_mapping(key: str):
@@ -107,17 +294,52 @@ def initialize_key_mapping(key: str):
     第一次使用某个密钥时：
     - 遍历 RawImg 下所有图片
     - 计算 32 位编码，再结合密钥做哈希 %29 得到字符下标
-    - 在 static/keys/<key_name>/<0-28>/ 里复制图片
-    - 在 mapping.json 中保存索引到文件列表的映射
+    - 在 mapping.json 中保存索引到文件名列表的映射
+    图片本体只保留 RawImg 里的一份，通过 /raw/<文件名> 路由访问，
+    不再为每个密钥复制整套图片目录。
+    同一密钥的并发初始化只会执行一次，其余调用等待结果。
     """
     key_name = safe_key_name(key)
     key_dir = os.path.join(KEYS_BASE_DIR, key_name)
     mapping_file = os.path.join(key_dir, "mapping.json")
 
-    if os.path.exists(mapping_file):
-        with open(mapping_file, "r", encoding="utf-8") as f:
-            return json.load(f), False
+    groups = _load_mapping_file(mapping_file)
+    if groups is not None:
+        return groups, False
+
+    with _init_cond:
+        while key_name in _initializing_keys:
+            _init_cond.wait()
+        # 等待期间可能已被别的线程建好
+        groups = _load_mapping_file(mapping_file)
+        if groups is not None:
+            return groups, False
+        _initializing_keys.add(key_name)
+
+    try:
+        return _build_key_mapping(key, key_dir, mapping_file), True
+    finally:
+        with _init_cond:
+            _initializing_keys.discard(key_name)
+            _init_cond.notify_all()
+
+
+def warm_key_mapping(key: str):
+    """
+    后台线程预热密钥映射：分配密钥时就开始初始化，
+    用户发第一条加密消息时 mapping.json 基本已经就绪
+    """
+    def _run():
+        try:
+            initialize_key_mapping(key)
+        except Exception:
+            # 预热失败不影响请求路径，真正加密时会重试并把错误返回给用户
+            pass
+
+    threading.Thread(target=_run, daemon=True).start()
 
+
+def _build_key_mapping(key, key_dir, mapping_file):
     os.makedirs(key_dir, exist_ok=True)
     groups = {str(i): [] for i in range(ALPHABET_SIZE)}
 
@@ -132,28 +354,23 @@ def initialize_key_mapping(key: str):
         image_files.extend(raw_path.glob(f"*{ext.upper()}"))
 
     image_files = sorted(image_files, key=lambda x: x.name)
+    binaries = load_image_binaries(image_files)
 
+    # 密钥前缀只编码一次，循环内只剩编码+哈希两个C级调用
+    key_prefix = (key + ":").encode("utf-8")
     for img_path in image_files:
-        binary_string, _, _ = image_to_binary(str(img_path))
+        binary_string = binaries.get(img_path.name)
         if not binary_string:
             continue
-        idx = compute_char_index(binary_string, key)
-        idx_str = str(idx)
-
-        target_dir = os.path.join(key_dir, idx_str)
-        os.makedirs(target_dir, exist_ok=True)
-        target_name = img_path.name
-        target_path = os.path.join(target_dir, target_name)
-
-        if not os.path.exists(target_path):
-            shutil.copy2(str(img_path), target_path)
-
-        groups[idx_str].append(target_name)
+        idx = _char_index_from_bytes(key_prefix + binary_string.encode("utf-8"))
+        groups[str(idx)].append(img_path.name)
 
     with open(mapping_file, "w", encoding="utf-8") as f:
-        json.dump(groups, f, ensure_ascii=False)
+        json.dump({"version": MAPPING_VERSION, "groups": groups}, f, ensure_ascii=False)
+
+    _existing_keys.add(os.path.basename(key_dir))
 
-    return groups, True
+    return groups
 
 
 @app.route("/")
@@ -168,27 +385,41 @@ def upload_image():
     前端通过 FormData POST 文件，返回图片 URL
     """
     if "image" not in request.files:
-        return jsonify({"success": False, "error": "No image file provided"}), 400
+        return json_response({"success": False, "error": "No image file provided"}, 400)
 
     file = request.files["image"]
     if file.filename == "":
-        return jsonify({"success": False, "error": "Empty filename"}), 400
+        return json_response({"success": False, "error": "Empty filename"}, 400)
 
     ext = os.path.splitext(file.filename)[1].lower()
     if ext not in [".png", ".jpg", ".jpeg", ".gif", ".webp"]:
-        return jsonify({"success": False, "error": "Unsupported file type"}), 400
+        return json_response({"success": False, "error": "Unsupported file type"}, 400)
 
     filename = f"{uuid.uuid4().hex}{ext}"
     save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(save_path)
+    save_upload(file, save_path)
 
     image_url = f"/static/uploads/{filename}"
-    return jsonify({"success": True, "url": image_url})
+    return json_response({"success": True, "url": image_url})
 
 
 @app.route("/static/uploads/<path:filename>")
 def uploaded_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    # 文件名是 uuid、内容不可变：带 ETag 的条件响应 + 一年缓存，
+    # 浏览器重新进入页面时不再整张重拉
+    resp = send_from_directory(
+        app.config["UPLOAD_FOLDER"], filename, conditional=True, max_age=31536000
+    )
+    resp.cache_control.immutable = True
+    return resp
+
+
+@app.route("/raw/<path:filename>")
+def raw_image(filename):
+    # RawImg 图片同样不可变，用同样的缓存策略
+    resp = send_from_directory(RAW_IMG_DIR, filename, conditional=True, max_age=31536000)
+    resp.cache_control.immutable = True
+    return resp
 
 
 @app.route("/api/heartbeat", methods=["POST"])
@@ -197,9 +428,9 @@ def heartbeat():
     user_id = data.get("userId")
     username = (data.get("username") or "匿名用户").strip() or "匿名用户"
     if not user_id:
-        return jsonify({"ok": False, "error": "missing userId"}), 400
-    online_users[user_id] = {"username": username, "last_seen": now_ms()}
-    return jsonify({"ok": True, "users": get_online_users()})
+        return json_response({"ok": False, "error": "missing userId"}, 400)
+    _touch_online(user_id, username)
+    return json_response({"ok": True, "users": get_online_users()})
 
 
 @app.route("/api/send_message", methods=["POST"])
@@ -209,12 +440,11 @@ def api_send_message():
     username = (data.get("username") or "匿名用户").strip() or "匿名用户"
     content = (data.get("content") or "").strip()
     if not user_id or not content:
-        return jsonify({"ok": False, "error": "bad payload"}), 400
+        return json_response({"ok": False, "error": "bad payload"}, 400)
 
     msg = make_message(user_id, username, "text", content)
-    messages.append(msg)
-    prune_history()
-    return jsonify({"ok": True, "message": msg})
+    append_message(msg)
+    return json_response({"ok": True, "message": msg})
 
 
 @app.route("/api/send_image", methods=["POST"])
@@ -224,12 +454,11 @@ def api_send_image():
     username = (data.get("username") or "匿名用户").strip() or "匿名用户"
     url = (data.get("url") or "").strip()
     if not user_id or not url:
-        return jsonify({"ok": False, "error": "bad payload"}), 400
+        return json_response({"ok": False, "error": "bad payload"}, 400)
 
     msg = make_message(user_id, username, "image", url)
-    messages.append(msg)
-    prune_history()
-    return jsonify({"ok": True, "message": msg})
+    append_message(msg)
+    return json_response({"ok": True, "message": msg})
 
 
 @app.route("/api/messages")
@@ -242,9 +471,11 @@ def api_messages():
         since = int(request.args.get("since", "0"))
     except ValueError:
         since = 0
-    new_msgs = [m for m in messages if m.get("tsMs", 0) > since]
+    # tsMs 单调递增，用二分定位第一条新消息，免去整表扫描
+    start = bisect.bisect_right(_message_ts, since)
+    new_msgs = list(islice(messages, start, len(messages)))
     server_time = now_ms()
-    return jsonify({"ok": True, "messages": new_msgs, "serverTime": server_time})
+    return json_response({"ok": True, "messages": new_msgs, "serverTime": server_time})
 
 
 @app.route("/api/assign_key", methods=["POST"])
@@ -258,7 +489,7 @@ def api_assign_key():
     user_id = data.get("userId")
     username = (data.get("username") or "匿名用户").strip() or "匿名用户"
     if not user_id:
-        return jsonify({"ok": False, "error": "missing userId"}), 400
+        return json_response({"ok": False, "error": "missing userId"}, 400)
 
     # 更新/记录在线用户（此处不设置 last_seen，只记录用户名和密钥）
     info = online_users.get(user_id, {})
@@ -267,18 +498,13 @@ def api_assign_key():
 
     # 如果该用户之前已经有密钥，就直接返回
     if info.get("key"):
-        return jsonify({"ok": True, "key": info["key"], "existing": True})
+        return json_response({"ok": True, "key": info["key"], "existing": True})
 
-    # 已存在的密钥目录（历史上用过的）
-    existing_keys = []
-    base = Path(KEYS_BASE_DIR)
-    if base.exists():
-        for p in base.iterdir():
-            if p.is_dir():
-                existing_keys.append(p.name)
+    # 已存在的密钥目录（历史上用过的），用启动时扫描的缓存，免去每次 stat 整个目录
+    existing_keys = _existing_keys
 
     # 当前在线用户已经占用的密钥（仅考虑最近一段时间内活跃的）
-    cutoff = now_ms() - 25_000
+    cutoff = now_ms() - _ONLINE_TIMEOUT_MS
     used_keys_online = {
         uinfo.get("key")
         for uinfo in online_users.values()
@@ -291,7 +517,8 @@ def api_assign_key():
         chosen = random.choice(candidates)
         info["key"] = chosen
         online_users[user_id] = info
-        return jsonify({"ok": True, "key": chosen, "existing": True})
+        warm_key_mapping(chosen)
+        return json_response({"ok": True, "key": chosen, "existing": True})
 
     # 没有可用旧密钥，则生成新的随机密钥，显式避免与当前所有已用密钥/目录重复
     all_used_keys = {
@@ -307,7 +534,8 @@ def api_assign_key():
 
     info["key"] = new_key
     online_users[user_id] = info
-    return jsonify({"ok": True, "key": new_key, "existing": False})
+    warm_key_mapping(new_key)
+    return json_response({"ok": True, "key": new_key, "existing": False})
 
 
 @app.route("/api/encrypt_text", methods=["POST"])
@@ -319,42 +547,37 @@ def api_encrypt_text():
     key = (data.get("key") or "").strip()
     text = (data.get("text") or "").strip()
     if not key or not text:
-        return jsonify({"ok": False, "error": "缺少密钥或文本"}), 400
+        return json_response({"ok": False, "error": "缺少密钥或文本"}, 400)
 
     try:
         mapping, initialized_now = initialize_key_mapping(key)
     except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
-
-    key_name = safe_key_name(key)
-    urls = []
-
-    # 为了一个消息内部尽量不用同一字符的同一图片，这里为每个字符下标维护一个已使用列表
-    used_per_index = {str(i): set() for i in range(ALPHABET_SIZE)}
-
-    for ch in text:
-        idx = char_to_index(ch)
-        idx_str = str(idx)
+        return json_response({"ok": False, "error": str(e)}, 500)
+
+    # 第一遍统计每个字符下标需要多少张图，
+    # 每个下标用 random.sample 一次性无放回抽够（超过图片数时按整轮循环补抽），
+    # 第二遍按文本顺序从各自队列里 popleft
+    indices = [str(char_to_index(ch)) for ch in text]
+    picks = {}
+    for idx_str, count in Counter(indices).items():
         files = mapping.get(idx_str) or []
         if not files:
             continue
+        chosen = []
+        while count > 0:
+            take = min(count, len(files))
+            chosen.extend(random.sample(files, take))
+            count -= take
+        picks[idx_str] = deque(chosen)
 
-        candidates = list(files)
-        used = used_per_index[idx_str]
-
-        # 优先从“未使用”集合里随机选，如果都用过了就允许重复
-        unused = [f for f in candidates if f not in used]
-        if unused:
-            file_name = random.choice(unused)
-        else:
-            file_name = random.choice(candidates)
-
-        used.add(file_name)
-
-        url = f"/static/keys/{key_name}/{idx_str}/{file_name}"
-        urls.append(url)
+    urls = []
+    for idx_str in indices:
+        pick = picks.get(idx_str)
+        if not pick:
+            continue
+        urls.append(f"/raw/{pick.popleft()}")
 
-    return jsonify({"ok": True, "images": urls, "initializedNow": initialized_now})
+    return json_response({"ok": True, "images": urls, "initializedNow": initialized_now})
 
 
 @app.route("/api/decrypt_images", methods=["POST"])
@@ -364,11 +587,11 @@ def api_decrypt_images():
     """
     key = (request.form.get("key") or "").strip()
     if not key:
-        return jsonify({"ok": False, "error": "缺少密钥"}), 400
+        return json_response({"ok": False, "error": "缺少密钥"}, 400)
 
     files = request.files.getlist("images")
     if not files:
-        return jsonify({"ok": False, "error": "没有接收到图片"}), 400
+        return json_response({"ok": False, "error": "没有接收到图片"}, 400)
 
     chars = []
     temp_paths = []
@@ -378,7 +601,7 @@ def api_decrypt_images():
             ext = os.path.splitext(f.filename)[1].lower()
             tmp_name = f"{uuid.uuid4().hex}{ext or '.png'}"
             tmp_path = os.path.join(TEMP_DECRYPT_DIR, tmp_name)
-            f.save(tmp_path)
+            save_upload(f, tmp_path)
             temp_paths.append(tmp_path)
 
             binary_string, _, _ = image_to_binary(tmp_path)
@@ -395,7 +618,7 @@ def api_decrypt_images():
                 pass
 
     text = "".join(chars)
-    return jsonify({"ok": True, "text": text})
+    return json_response({"ok": True, "text": text})
 
 
 @app.route("/api/logout", methods=["POST"])
@@ -405,9 +628,9 @@ def api_logout():
     """
     data = request.get_json(force=True, silent=True) or {}
     user_id = data.get("userId")
-    if user_id and user_id in online_users:
-        online_users.pop(user_id, None)
-    return jsonify({"ok": True})
+    if user_id:
+        _remove_online(user_id)
+    return json_response({"ok": True})
 
 
 if __name__ == "__main__":
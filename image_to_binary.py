@@ -45,15 +45,12 @@ def extract_sift_features(image_path, threshold=10.0):
         keypoints: 特征点列表
         descriptors: 特征描述符
     """
-    # 读取图片
-    img = cv2.imread(image_path)
-    if img is None:
+    # 直接按灰度解码，省掉三通道解码后再转灰度的开销
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
         print(f"无法读取图片: {image_path}")
         return [], None
-    
-    # 转换为灰度图
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
+
     # 创建SIFT检测器
     sift = cv2.SIFT_create()
     
@@ -184,62 +181,82 @@ def image_to_binary(image_path, threshold=6.0):
         all_keypoints: 所有块的特征点信息（用于可视化）
         block_coords: 块的坐标信息
     """
-    # 读取图片
-    img = cv2.imread(image_path)
-    if img is None:
+    # 直接按灰度解码，比解码三通道再cvtColor省2/3的内存带宽
+    gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
         print(f"无法读取图片: {image_path}")
         return None, None, None
-    
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    # 分成4x4共16块
-    blocks, block_coords = divide_image_into_blocks(gray, (4, 4))
-    
+
+    h, w = gray.shape[:2]
+    rows, cols = 4, 4
+    block_h = h // rows
+    block_w = w // cols
+    num_blocks = rows * cols
+
+    # 直接算出4x4共16块的坐标（只用于归属划分和可视化），不再实际切分图像
+    # 最后一行/列的块吃掉整除剩下的余数像素
+    block_coords = [
+        (
+            j * block_w,
+            i * block_h,
+            (j + 1) * block_w if j < cols - 1 else w,
+            (i + 1) * block_h if i < rows - 1 else h,
+        )
+        for i in range(rows)
+        for j in range(cols)
+    ]
+
+    # 创建SIFT检测器，整图只做一次特征提取
+    # （比逐块调用detectAndCompute快一个数量级，高斯金字塔只构建一次）
+    sift = cv2.SIFT_create()
+    keypoints, descriptors = sift.detectAndCompute(gray, None)
+
+    grouped_kps = [[] for _ in range(num_blocks)]
+    counts = np.zeros(num_blocks)
+    cos_sum = np.zeros(num_blocks)
+    sin_sum = np.zeros(num_blocks)
+
+    if keypoints:
+        # 用NumPy批量完成“特征点 -> 所属块”的划分和角度统计
+        pts = np.array([kp.pt for kp in keypoints], dtype=np.float32)
+        sizes = np.fromiter((kp.size for kp in keypoints), np.float32, len(keypoints))
+        angles = np.fromiter((kp.angle for kp in keypoints), np.float32, len(keypoints))
+
+        bi = np.clip((pts[:, 1] // block_h).astype(int), 0, rows - 1)
+        bj = np.clip((pts[:, 0] // block_w).astype(int), 0, cols - 1)
+        block_ids = bi * cols + bj
+
+        # 筛选特征点（按大小阈值）
+        mask = sizes >= threshold
+        sel_ids = block_ids[mask]
+        sel_rads = np.radians(angles[mask])
+
+        counts = np.bincount(sel_ids, minlength=num_blocks)
+        # 角度的圆均值：分别累加cos/sin再求arctan2，避免跨360度时算术平均出错
+        cos_sum = np.bincount(sel_ids, weights=np.cos(sel_rads), minlength=num_blocks)
+        sin_sum = np.bincount(sel_ids, weights=np.sin(sel_rads), minlength=num_blocks)
+
+        for kp, keep, blk in zip(keypoints, mask, block_ids):
+            if keep:
+                grouped_kps[blk].append(kp)
+
     binary_bits = []
     all_keypoints = []
-    
-    # 创建SIFT检测器
-    sift = cv2.SIFT_create()
-    
-    # 对每一块提取SIFT特征
-    for idx, block in enumerate(blocks):
-        # 提取该块的SIFT特征
-        keypoints, descriptors = sift.detectAndCompute(block, None)
-        
-        # 筛选特征点
-        filtered_kps = []
-        filtered_descs = []
-        
-        if descriptors is not None:
-            for i, kp in enumerate(keypoints):
-                if kp.size >= threshold:
-                    filtered_kps.append(kp)
-                    filtered_descs.append(descriptors[i])
-        
-        # 计算该块的特征向量方向
-        if len(filtered_kps) > 0:
-            # 使用所有特征点的平均方向
-            angles = [kp.angle for kp in filtered_kps]
-            mean_angle = np.mean(angles)
-            
-            # 或者使用描述符的主方向
-            if len(filtered_descs) > 0:
-                desc_array = np.array(filtered_descs)
-                # 计算描述符的主方向（简化方法）
-                # 使用关键点的角度更直接
-                quadrant = get_vector_quadrant(mean_angle)
-            else:
-                quadrant = get_vector_quadrant(mean_angle)
+
+    for idx in range(num_blocks):
+        if counts[idx] > 0:
+            mean_direction = np.arctan2(sin_sum[idx], cos_sum[idx])
+            quadrant = get_vector_quadrant(mean_direction)
         else:
             # 如果没有特征点，使用默认值
             quadrant = "00"
-        
+
         binary_bits.append(quadrant)
-        all_keypoints.append((filtered_kps, block_coords[idx]))
-    
+        all_keypoints.append((grouped_kps[idx], block_coords[idx]))
+
     # 组合成32位二进制字符串
     binary_string = ''.join(binary_bits)
-    
+
     return binary_string, all_keypoints, block_coords
 
 
@@ -249,7 +266,8 @@ def visualize_features(image_path, keypoints_info, block_coords, output_path):
     
     Args:
         image_path: 原始图片路径
-        keypoints_info: 所有块的特征点信息，每个元素是(keypoints, (x1, y1, x2, y2))
+        keypoints_info: 所有块的特征点信息，每个元素是(keypoints, (x1, y1, x2, y2))，
+                        特征点坐标为整图全局坐标
         block_coords: 块的坐标信息列表（未使用，保留用于兼容性）
         output_path: 输出图片路径
     """
@@ -265,9 +283,9 @@ def visualize_features(image_path, keypoints_info, block_coords, output_path):
     # 遍历每个块的特征点
     for (keypoints, (bx1, by1, bx2, by2)) in keypoints_info:
         for kp in keypoints:
-            # 将块内坐标转换为全局坐标
-            x = int(kp.pt[0] + bx1)
-            y = int(kp.pt[1] + by1)
+            # 特征点坐标已经是全局坐标
+            x = int(kp.pt[0])
+            y = int(kp.pt[1])
             size = int(kp.size)
             angle = kp.angle
             